@@ -7,12 +7,17 @@ from .parse_cpp_exports import parse_cpp_exports
 from .create_cpp_bindings import create_cpp_bindings
 from .create_py_bindings import create_py_bindings
 
-def find_cpp_files(location, found):
-    for f in os.scandir(location):
-        if f.is_dir():
-            find_cpp_files(f.path, found)
-        elif f.path.lower().endswith(".cpp") or f.path.lower().endswith(".cc"):
-            found.append(f.path)
+cpp_extensions = (".cpp", ".cc")
+
+def find_cpp_files(location):
+    # Subdirectories are visited as they are encountered, so that the file
+    # order (and thus which duplicate export takes precedence) is unchanged.
+    with os.scandir(location) as entries:
+        for f in entries:
+            if f.is_dir():
+                yield from find_cpp_files(f.path)
+            elif f.name.lower().endswith(cpp_extensions):
+                yield f.path
 
 def main():
     parser = argparse.ArgumentParser(
@@ -48,12 +53,25 @@ This mimics the behavior of `Rcpp::compile()`, which does the same thing for C++
         default="core", 
         help="Prefix of the DLL."
     )
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=1,
+        help="Number of processes to use for parsing the C++ files.",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cachepath",
+        type=str,
+        default=None,
+        help="Path to a cache of parsed exports. Unchanged C++ files in this cache are not parsed again.",
+    )
     cmd_args = parser.parse_args()
 
-    all_files = []
-    find_cpp_files(cmd_args.srcdir, all_files)
+    all_files = list(find_cpp_files(cmd_args.srcdir))
 
-    all_functions = parse_cpp_exports(all_files)
+    all_functions = parse_cpp_exports(all_files, num_workers=cmd_args.workers, cache_path=cmd_args.cachepath)
     create_cpp_bindings(all_functions, cmd_args.cpppath)
     create_py_bindings(all_functions, cmd_args.pypath, cmd_args.dllname)
 
@@ -1,7 +1,28 @@
+import functools
+import mmap
+import os
+import pickle
 import re
-
-export_regex = re.compile("^\\s*//\\s*\\[\\[export\\]\\]")
-comment_regex = re.compile("//")
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+# Each match is classified by the name of its group, so that the regex engine
+# does all of the per-character work and the parser only sees whole tokens.
+# Files are scanned as raw bytes; only the final names and types are decoded.
+token_regex = re.compile(
+    rb"""
+    (?P<comment>//[^\n]*\n|/\*\*(?P<tags>.*?)\*/|/\*.*?\*/)
+    | (?P<unterminated>/[/*])
+    | (?P<space>\s+)
+    | (?P<text>[^\s<>(),/*&]+)
+    | (?P<char>.)
+    """,
+    re.S | re.X
+)
+
+# Argument lists without any of these characters can be split directly.
+complex_argument_regex = re.compile(rb"[<>(/]")
+simple_fragment_regex = re.compile(rb"[*&]|[^\s*&]+")
 
 class CppType:
     """C++ type, as parsed from the source file.
@@ -13,6 +34,8 @@ class CppType:
         tags (set[str]): Additional user-supplied tags.
     """
 
+    __slots__ = ("full_type", "base_type", "pointer_level", "tags")
+
     def __init__(self, full_type: str, base_type: str, pointer_level: int, tags: set[str]):
         """Construct a `CppType` instance from the supplied properties."""
         self.full_type = full_type
@@ -20,29 +43,27 @@ class CppType:
         self.pointer_level = pointer_level
         self.tags = set(tags)
 
-def create_type(fragments: list[str], tags: set[str]):
-    base_type = []
-    pointers = 0
-    right_pointers = False
+# Many arguments share the same type, so the resolved properties are cached.
+# The number of distinct types is small, so the cache is left unbounded.
+# Each call to create_type still returns a new CppType as the tags are mutable.
+@functools.lru_cache(maxsize=None)
+def _resolve_type(fragments: tuple[bytes, ...]) -> tuple[str, str, int]:
+    fragments = [x.decode() for x in fragments]
+    pointers = fragments.count("*")
+    base_type = [x for x in fragments if x and x != "const" and x != "*" and x != "&"]
 
-    for x in fragments:
-        if not x or x == "const" or x == "&":
-            continue
-        elif x == "*":
-            pointers += 1
-        else:
-            base_type.append(x)
+    # Fragments are space-separated, except before pointers/references or after an opening bracket.
+    full_out = fragments[:1]
+    for previous, x in zip(fragments, fragments[1:]):
+        if x != "*" and x != "&" and not previous.endswith(("<", "(")):
+            full_out.append(" ")
+        full_out.append(x)
 
-    full_out = ""
-    for x in fragments:
-        if x == "*" or x == "&":
-            full_out += x
-        else:
-            if full_out and full_out[-1] != "<" and full_out[-1] != "(":
-                full_out += " "
-            full_out += x
+    return "".join(full_out), " ".join(base_type), pointers
 
-    return CppType(full_out, " ".join(base_type), pointers, tags)
+def create_type(fragments: list[bytes], tags: set[str]):
+    full_type, base_type, pointers = _resolve_type(tuple(fragments))
+    return CppType(full_type, base_type, pointers, tags)
 
 class CppArgument:
     """Argument to a C++ function, as parsed from the source file.
@@ -52,196 +73,290 @@ class CppArgument:
         type (CppType): The type of the argument.
     """
 
+    __slots__ = ("name", "type")
+
     def __init__(self, name: str, type: CppType):
         """Construct a `CppArgument` instance from the supplied properties."""
         self.name = name
         self.type = type
 
-class ExportTraverser:
-    def __init__(self, handle):
-        self.handle = handle
-        self.line = ""
-        self.position = 0
-
-    def next(self):
-        if self.position == len(self.line):
-            self.line = self.handle.readline()
-            self.position = 0
-            if not self.line:
-                raise ValueError("reached end of the file with an unterminated export")
-        old = self.position
-        self.position += 1
-        return self.line[old]
-
-    def back(self):  # this can only be called once after calling next().
-        self.position -= 1
-
-def add_to_type_fragment(fragment: str, chunks: list[str], nested: bool):
-    if not nested:
-        if fragment:
-            chunks.append(fragment)
-        return ""
-    else:
-        return fragment
-
-def parse_component(grabber: ExportTraverser, as_argument: bool):
-    current = ""
-    chunks = []
-    tags = []
+def _line_at(data: mmap.mmap, position: int) -> str:
+    start = data.rfind(b"\n", 0, position) + 1
+    end = data.find(b"\n", position)
+    if end == -1:
+        end = len(data)
+    return data[start:end].decode()
+
+def add_to_type_fragment(fragment: list[bytes], chunks: list[bytes], nested: bool):
+    if not nested and fragment:
+        chunks.append(b"".join(fragment))
+        fragment.clear()
+
+def _unterminated():
+    return ValueError("reached end of the file with an unterminated export")
+
+def parse_component(data: mmap.mmap, position: int, as_argument: bool, current: list, chunks: list, tags: list):
+    # The scratch lists are supplied by the caller so they can be reused across components.
+    current.clear()
+    chunks.clear()
+    tags.clear()
     angle_nesting = 0
     curve_nesting = 0
     finished = False
 
-    while True:
-        x = grabber.next()
+    # 'current' is only ever modified in place, so its bound method can be reused.
+    append_current = current.append
 
-        if x.isspace():
-            current = add_to_type_fragment(current, chunks, curve_nesting or angle_nesting)
-            if current and current[-1] != "<" and current[-1] != "(" and current[-1] != " ":
-                current += " "
+    # The scanner is deliberately not bound to a name, so it is released as
+    # soon as the loop exits, even on error. Otherwise, a traceback would keep
+    # it alive along with its export of the mapping, which could not be closed.
+    for match in token_regex.finditer(data, position):
+        kind = match.lastgroup
+        x = match.group()
 
-        elif x == "/":
-            x = grabber.next()
+        if kind == "space":
+            add_to_type_fragment(current, chunks, curve_nesting or angle_nesting)
+            if current and not current[-1].endswith((b"<", b"(", b" ")):
+                append_current(b" ")
 
+        elif kind == "text":
+            append_current(x)
+
+        elif kind == "comment":
             # Comments terminate any existing chunk.
-            if x == "/" or x == "*":
-                current = add_to_type_fragment(current, chunks, curve_nesting or angle_nesting)
-                if x == "/":
-                    while True:
-                        if grabber.next() == "\n":
-                            break
+            add_to_type_fragment(current, chunks, curve_nesting or angle_nesting)
 
-                else:
-                    x = grabber.next()
-
-                    # We're inside a tag-enabled comment at the base nesting level, so we need to parse the tags.
-                    if x == "*" and not curve_nesting and not angle_nesting:
-                        curtag = ""
-                        while True:
-                            x = grabber.next()
-                            if x.isspace():
-                                if curtag:
-                                    tags.append(curtag)
-                                    curtag = ""
-                            elif x == "*":
-                                y = grabber.next()
-                                if y == "/":
-                                    if curtag:
-                                        tags.append(curtag)
-                                    break
-                                else:
-                                    curtag += x
-                                    grabber.back()  # put it back for looping, as it might be a space.
-                            else:
-                                curtag += x
-
-                    # Otherwise, just consuming the entire thing
-                    else:
-                        grabber.back()
-                        while True:
-                            if grabber.next() == "*":
-                                if grabber.next() == "/":
-                                    break
-
-            else: 
-                grabber.back()
-                current += x
-
-        elif x == "<":  # deal with templates.
+            # Tag-enabled comments are only respected at the base nesting level.
+            tag_body = match.group("tags")
+            if tag_body and not curve_nesting and not angle_nesting:
+                tags.extend(tag_body.decode().split())
+
+        elif kind == "unterminated":
+            raise _unterminated()
+
+        elif x == b"<":  # deal with templates.
             angle_nesting += 1
-            current += x
+            append_current(x)
 
-        elif x == ">":
+        elif x == b">":
             if angle_nesting == 0:
-                raise ValueError("imbalanced angle brackets at '" + grabber.line + "'")
+                raise ValueError("imbalanced angle brackets at '" + _line_at(data, match.start()) + "'")
             angle_nesting -= 1
-            current += x
-            current = add_to_type_fragment(current, chunks, curve_nesting or angle_nesting)
+            append_current(x)
+            add_to_type_fragment(current, chunks, curve_nesting or angle_nesting)
 
-        elif x == "(":
+        elif x == b"(":
             if as_argument:
                 curve_nesting += 1
-                current += x
+                append_current(x)
             else:
                 if curve_nesting == 0 and angle_nesting == 0:
-                    if current == "" and len(chunks):  # e.g., if there's a space between the name and '('.
-                        current = chunks.pop()
+                    if not current and len(chunks):  # e.g., if there's a space between the name and '('.
+                        append_current(chunks.pop())
                     break
                 curve_nesting += 1
-                current += x
+                append_current(x)
 
-        elif x == ")":
+        elif x == b")":
             if as_argument and not curve_nesting and not angle_nesting:
-                if current == "" and len(chunks):  # e.g., if there's a space between the final argument name and ')'.
-                    current = chunks.pop()
+                if not current and len(chunks):  # e.g., if there's a space between the final argument name and ')'.
+                    append_current(chunks.pop())
                 finished = True
                 break
 
             if curve_nesting == 0:
-                raise ValueError("imbalanced parentheses at '" + grabber.line + "'")
-            current += x
+                raise ValueError("imbalanced parentheses at '" + _line_at(data, match.start()) + "'")
+            append_current(x)
             curve_nesting -= 1
-            current = add_to_type_fragment(current, chunks, curve_nesting or angle_nesting)
+            add_to_type_fragment(current, chunks, curve_nesting or angle_nesting)
 
-        elif x == ",":
+        elif x == b",":
             if as_argument:
                 if curve_nesting or angle_nesting:
-                    current += x
+                    append_current(x)
                 else:
-                    if current == "" and len(chunks):
-                        current = chunks.pop()
+                    if not current and len(chunks):
+                        append_current(chunks.pop())
                     break
             else:
-                current += x
+                append_current(x)
 
-        elif x == "*" or x == "&":
-            current = add_to_type_fragment(current, chunks, angle_nesting or curve_nesting)
+        elif x == b"*" or x == b"&":
+            add_to_type_fragment(current, chunks, angle_nesting or curve_nesting)
             if current:
-                current += x
+                append_current(x)
             else:
                 chunks.append(x)
 
         else:
-            current += x
-
-    return current, create_type(chunks, tags), finished
+            append_current(x)
 
-def parse_cpp_file(path: str, all_functions: dict):
-    with open(path, "r") as handle:
+    else:
+        raise _unterminated()
+
+    return b"".join(current).decode(), create_type(chunks, tags), finished, match.end()
+
+def parse_simple_arguments(data: mmap.mmap, position: int):
+    # Most signatures have no templates, nested parentheses or comments in their
+    # arguments, so we can just split on commas. Otherwise, we return None and
+    # the caller falls back to parse_component.
+    end = data.find(b")", position)
+    if end == -1:
+        return None
+    argstring = data[position:end]
+    if complex_argument_regex.search(argstring):
+        return None
+
+    all_args = []
+    for arg in argstring.split(b","):
+        fragments = simple_fragment_regex.findall(arg)
+        if fragments:  # avoid adding an empty argument.
+            name = fragments.pop()
+            all_args.append(CppArgument(name.decode(), create_type(fragments, [])))
+
+    return all_args, end + 1
+
+def _skip_line(data: mmap.mmap, position: int) -> int:
+    end = data.find(b"\n", position)
+    return len(data) if end == -1 else end + 1
+
+def parse_cpp_file(path: str) -> Iterator[tuple[str, tuple[CppType, list[CppArgument]]]]:
+    with open(path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:  # empty files can't be mapped.
+            return
+
+        # The mapping is scanned directly so that only the extracted tokens are copied.
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with data:
+        # Most files don't have any exports, in which case the first search
+        # fails and nothing else is done.
+        current = []
+        chunks = []
+        tags = []
+        position = 0
         while True:
-            line = handle.readline()
-            if not line:
+            marker = data.find(b"[[export]]", position)
+            if marker == -1:
                 break
 
-            if not export_regex.match(line):
+            # The signature starts on the line after the marker. We only need to
+            # check that the marker is preceded by '//' and whitespace on its line.
+            # As the prefix never contains a newline, strip() removes exactly the
+            # space, tab, '\r', '\f' and '\v' characters allowed by the old
+            # '^[^\S\n]*//[^\S\n]*' regex.
+            line_start = data.rfind(b"\n", 0, marker) + 1
+            position = _skip_line(data, marker)
+            if data[line_start:marker].strip() != b"//":
                 continue
 
-            grabber = ExportTraverser(handle)
+            # Each component consumes tokens up to its terminating delimiter.
+            funname, restype, finished, position = parse_component(data, position, False, current, chunks, tags)
 
-            funname, restype, finished = parse_component(grabber, False)
-
-            all_args = []
-            while not finished:
-                name, argtype, finished = parse_component(grabber, True)
-                if name: # avoid adding an empty argument.
-                    all_args.append(CppArgument(name, argtype))
-
-            all_functions[funname] = (restype, all_args)
-
-def parse_cpp_exports(files: list[str]) -> dict[str, tuple[CppType, list[CppArgument]]]:
+            simple = parse_simple_arguments(data, position)
+            if simple is not None:
+                all_args, position = simple
+            else:
+                all_args = []
+                while not finished:
+                    name, argtype, finished, position = parse_component(data, position, True, current, chunks, tags)
+                    if name: # avoid adding an empty argument.
+                        all_args.append(CppArgument(name, argtype))
+
+            yield funname, (restype, all_args)
+
+            # Skipping the rest of the line containing the end of the signature.
+            position = _skip_line(data, position)
+
+def _parse_one(path: str) -> dict:
+    # Errors are labelled here rather than in the caller, which only knows the
+    # batch containing the failed file when parsing in parallel.
+    try:
+        return dict(parse_cpp_file(path))
+    except Exception as exc:
+        raise ValueError("failed to parse '" + path + "'") from exc
+
+# Bump this whenever the pickled representation of the parsed exports changes.
+_cache_version = 2
+
+def _read_cache(cache_path: str) -> dict:
+    try:
+        with open(cache_path, "rb") as handle:
+            version, contents = pickle.load(handle)
+    except Exception:  # missing, corrupted or from an incompatible version.
+        return {}
+    if version != _cache_version:
+        return {}
+    return contents
+
+def _write_cache(cache_path: str, contents: dict):
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as handle:
+        pickle.dump((_cache_version, contents), handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+def parse_cpp_exports(files: list[str], num_workers: int = 1, cache_path: Optional[str] = None) -> dict[str, tuple[CppType, list[CppArgument]]]:
     """Parse C++ source files for tagged exports.
 
     Args:
         files (list[str]): Paths of C++ source files to parse. 
+        num_workers (int): Number of processes to use for parsing files in parallel.
+            If 1, files are parsed serially in the current process.
+        cache_path (str, optional): Path to a cache of the exports from a previous call.
+            Files with the same modification time and size as in the cache are not parsed again.
+            The cache is created or updated with the results of this call.
+            If None, no caching is performed.
 
     Returns:
         Dict where keys are exported function names and values
         are a tuple of (return type, argument list).
     """
+    previous = {}
+    if cache_path is not None:
+        previous = _read_cache(cache_path)
+
+    per_file = {}
+    stamps = {}
+    to_parse = []
+    for p in files:
+        if cache_path is not None:
+            key = os.path.abspath(p)
+            try:
+                info = os.stat(p)
+            except Exception as exc:
+                raise ValueError("failed to parse '" + p + "'") from exc
+            stamp = (info.st_mtime_ns, info.st_size)
+            stamps[p] = (key, stamp)
+            hit = previous.get(key)
+            if hit is not None and hit[0] == stamp:
+                per_file[p] = hit[1]
+                continue
+        to_parse.append(p)
+
+    executor = None
+    if num_workers > 1 and len(to_parse) > 1:
+        # Sending files in batches, as most are small enough that the
+        # inter-process communication would otherwise dominate.
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+        chunksize = max(1, len(to_parse) // (num_workers * 4))
+        results = executor.map(_parse_one, to_parse, chunksize=chunksize)
+    else:
+        results = map(_parse_one, to_parse)
+
+    try:
+        for p in to_parse:
+            per_file[p] = next(results)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    # Merging in the order of 'files', so later definitions take precedence
+    # regardless of whether the parsing was done in parallel or cached.
     all_functions = {}
     for p in files:
-        try:
-            parse_cpp_file(p, all_functions)
-        except Exception as exc:
-            raise ValueError("failed to parse '" + p + "'") from exc
+        all_functions.update(per_file[p])
+
+    if cache_path is not None:
+        _write_cache(cache_path, { key: (stamp, per_file[p]) for p, (key, stamp) in stamps.items() })
+
     return all_functions
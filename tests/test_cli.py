@@ -1,2 +1,28 @@
+from cpptypes.__main__ import find_cpp_files
+import tempfile
+import os
+
 def test_cli():
     assert True
+
+def test_find_cpp_files():
+    tmp = tempfile.mkdtemp()
+    os.makedirs(os.path.join(tmp, "sub", "deeper"))
+    for f in ["a.cpp", "b.h", os.path.join("sub", "c.CC"), os.path.join("sub", "deeper", "d.cpp"), os.path.join("sub", "e.py")]:
+        with open(os.path.join(tmp, f), "w") as handle:
+            handle.write("")
+
+    found = sorted(os.path.relpath(x, tmp) for x in find_cpp_files(tmp))
+    assert found == sorted(["a.cpp", os.path.join("sub", "c.CC"), os.path.join("sub", "deeper", "d.cpp")])
+
+    # Same order as a pre-order traversal of each directory's entries.
+    def reference(location, found):
+        for f in os.scandir(location):
+            if f.is_dir():
+                reference(f.path, found)
+            elif f.path.lower().endswith(".cpp") or f.path.lower().endswith(".cc"):
+                found.append(f.path)
+
+    expected = []
+    reference(tmp, expected)
+    assert list(find_cpp_files(tmp)) == expected
@@ -1,5 +1,8 @@
 import cpptypes as cw
+from cpptypes.parse_cpp_exports import _cache_version
 import tempfile
+import pickle
+import os
 
 def dump_str_to_file(content):
     tmp = tempfile.NamedTemporaryFile(delete = False)
@@ -7,6 +10,15 @@ def dump_str_to_file(content):
         handle.write(content)
     return tmp.name
 
+def test_cpp_type_tags():
+    # Tags are copied, so types built from the same set don't affect each other.
+    tags = set(["numpy", "non_contig"])
+    a = cw.CppType("int*", "int", 1, tags)
+    b = cw.CppType("int*", "int", 1, tags)
+    a.tags.remove("numpy")
+    assert b.tags == set(["numpy", "non_contig"])
+    assert tags == set(["numpy", "non_contig"])
+
 def test_parse_cpp_exports_basic():
     # Just some basic pointers here and there.
     tmp = dump_str_to_file("""
@@ -65,6 +77,153 @@ int* empty() {
 
     assert len(args) == 0
 
+def test_parse_cpp_exports_none():
+    # Files without any exports, or without anything at all.
+    tmp = dump_str_to_file("""
+// [[not_an_export]]
+int foobar(int x) {
+    return x
+}""")
+    empty = dump_str_to_file("")
+
+    output = cw.parse_cpp_exports([tmp, empty])
+    assert output == {}
+
+    # Markers that aren't the only thing in a '//' comment are ignored.
+    tmp = dump_str_to_file("""
+int y; // [[export]]
+int foo(int x) {}
+/// [[export]]
+int bar(int x) {}
+[[export]]
+int baz(int x) {}
+/* [[export]] */
+int qux(int x) {}
+//x [[export]]
+int quux(int x) {}""")
+
+    output = cw.parse_cpp_exports([tmp])
+    assert output == {}
+
+    # Any non-newline whitespace is allowed around the '//'.
+    tmp = dump_str_to_file(" \t// \t[[export]]\r\nint foo(int x) {}\r\n\t//[[export]] trailing\nint bar(double y) {}\n")
+    output = cw.parse_cpp_exports([tmp])
+    assert sorted(output.keys()) == ["bar", "foo"]
+    assert output["foo"][1][0].name == "x"
+    assert output["bar"][1][0].type.full_type == "double"
+
+def test_parse_cpp_exports_parallel():
+    first = dump_str_to_file("""
+//[[export]]
+int foobar(int x) {
+    return x
+}""")
+    second = dump_str_to_file("""
+//[[export]]
+double* whee(const char* y) {
+    return NULL
+}
+//[[export]]
+void foobar(double x) {}""")
+
+    output = cw.parse_cpp_exports([first, second], num_workers=2)
+    assert sorted(output.keys()) == ["foobar", "whee"]
+    assert output["whee"][0].full_type == "double*"
+    assert output["whee"][1][0].type.full_type == "const char*"
+
+    # Later files take precedence, as in the serial case.
+    assert output["foobar"][0].full_type == "void"
+    assert output["foobar"][1][0].type.full_type == "double"
+
+    failed = dump_str_to_file("""
+//[[export]]
+int foobar(X x,""")
+
+    err = None
+    try:
+        cw.parse_cpp_exports([first, failed], num_workers=2)
+    except Exception as exc:
+        err = exc
+    assert err is not None
+    assert str(err) == "failed to parse '" + failed + "'"
+    assert "reached end of the file" in str(err.__cause__) # the cause is the worker's traceback.
+
+    # Files are sent in batches when there are enough of them, but the error
+    # should still name the failed file rather than the first in its batch.
+    many = [first] * 20
+    many[5] = failed
+    err = None
+    try:
+        cw.parse_cpp_exports(many, num_workers=2)
+    except Exception as exc:
+        err = exc
+    assert err is not None
+    assert str(err) == "failed to parse '" + failed + "'"
+
+def test_parse_cpp_exports_cache():
+    tmp = dump_str_to_file("""
+//[[export]]
+int foobar(int x) {
+    return x
+}""")
+    cache = os.path.join(tempfile.mkdtemp(), "cache.pkl")
+
+    output = cw.parse_cpp_exports([tmp], cache_path=cache)
+    assert output["foobar"][1][0].type.full_type == "int"
+    assert os.path.exists(cache)
+
+    # Same size and modification time, so the cached result is used.
+    info = os.stat(tmp)
+    with open(tmp, "w") as handle:
+        handle.write("""
+//[[export]]
+int foobar(int y) {
+    return y
+}""")
+    os.utime(tmp, ns=(info.st_atime_ns, info.st_mtime_ns))
+
+    output = cw.parse_cpp_exports([tmp], cache_path=cache)
+    assert output["foobar"][1][0].name == "x"
+
+    # Different size, so the file is parsed again.
+    with open(tmp, "w") as handle:
+        handle.write("""
+//[[export]]
+int foobar(double zzz) {
+    return 1
+}""")
+
+    output = cw.parse_cpp_exports([tmp], cache_path=cache)
+    assert output["foobar"][1][0].name == "zzz"
+    assert output["foobar"][1][0].type.full_type == "double"
+
+    # Corrupted caches are ignored.
+    with open(cache, "w") as handle:
+        handle.write("whee")
+    output = cw.parse_cpp_exports([tmp], cache_path=cache)
+    assert output["foobar"][1][0].name == "zzz"
+
+    # Caches from a different version are ignored.
+    info = os.stat(tmp)
+    stale = { os.path.abspath(tmp): ((info.st_mtime_ns, info.st_size), { "stale": None }) }
+    with open(cache, "wb") as handle:
+        pickle.dump((_cache_version + 1, stale), handle)
+    output = cw.parse_cpp_exports([tmp], cache_path=cache)
+    assert "stale" not in output
+    assert output["foobar"][1][0].name == "zzz"
+
+    # Missing files raise the same error as without a cache.
+    missing = os.path.join(tempfile.mkdtemp(), "missing.cpp")
+    for c in [None, cache]:
+        err = None
+        try:
+            cw.parse_cpp_exports([missing], cache_path=c)
+        except Exception as exc:
+            err = exc
+        assert isinstance(err, ValueError)
+        assert str(err).startswith("failed to parse")
+        assert isinstance(err.__cause__, FileNotFoundError)
+
 def test_parse_cpp_exports_whitespace():
     # Add or remove whitespace all over the place.
     tmp = dump_str_to_file("""
@@ -152,6 +311,42 @@ std::vector<decltype(bar)>foobar( decltype(FOO)x, const std::list<std::vector<in
     assert args[4].type.base_type == "std::vector<char>"
     assert args[4].type.pointer_level == 1
 
+    assert args[5].name == "div"
+    assert args[5].type.full_type == "decltype(a/b)"
+    assert args[5].type.base_type == "decltype(a/b)"
+    assert args[5].type.pointer_level == 0
+
+    # A plain comment ending with '**/' is closed there, not at a later '*/'.
+    tmp = dump_str_to_file("""
+//[[export]]
+int foobar(int x /* a comment **/, double y /* another comment */) {
+    return 1
+}""")
+
+    output = cw.parse_cpp_exports([tmp])
+    args = output["foobar"][1]
+    assert len(args) == 2
+    assert args[0].name == "x"
+    assert args[0].type.full_type == "int"
+    assert args[1].name == "y"
+    assert args[1].type.full_type == "double"
+
+    # An empty '/**/' comment is closed without needing a later '*/'.
+    tmp = dump_str_to_file("""
+//[[export]]
+int foobar(int x /**/, double y) {
+    return 1
+}""")
+
+    output = cw.parse_cpp_exports([tmp])
+    args = output["foobar"][1]
+    assert len(args) == 2
+    assert args[0].name == "x"
+    assert args[0].type.full_type == "int"
+    assert args[0].type.tags == set()
+    assert args[1].name == "y"
+    assert args[1].type.full_type == "double"
+
 def test_parse_cpp_exports_tags():
     # Add templates, type inference and references.
     tmp = dump_str_to_file("""
@@ -231,3 +426,17 @@ int foobar(X x, const std::vector<int> > y,""")
         err = exc
     assert err is not None
     assert str(err.__cause__).startswith("imbalanced angle brackets")
+
+    # Comments that are never closed within the signature.
+    for unterminated in [ "/* not closed", "/** not a closed tag", "// no newline" ]:
+        tmp = dump_str_to_file("""
+//[[export]]
+int foobar(X x, const YYY y """ + unterminated)
+
+        err = None
+        try:
+            cw.parse_cpp_exports([tmp])
+        except Exception as exc:
+            err = exc
+        assert err is not None
+        assert str(err.__cause__).startswith("reached end of the file")